@@ -8,71 +8,56 @@ This file contains functions used to do a PCIe level reset for Wormhole chip.
 import os
 import sys
 import time
-import fcntl
-import struct
 from typing import List
+from contextlib import ExitStack
 from pyluwen import PciChip
 from tt_tools_common.ui_common.themes import CMD_LINE_COLOR
+from tt_tools_common.reset_common import chip_reset
+from tt_tools_common.reset_common.chip_reset import ChipReset
 from tt_tools_common.utils_common.tools_utils import read_refclk_counter
-from tt_tools_common.utils_common.system_utils import (
-    # check_driver_version,
-    get_host_info,
-)
 
+# from tt_tools_common.utils_common.system_utils import check_driver_version
 
-class BHChipReset:
+# Config space path, formatted for every device on each reset
+_SYSFS_CONFIG_PATH_FMT = "/sys/bus/pci/devices/{}/config".format
+
+
+def _bdf_for_interface(interface_id: int) -> str:
+    """Look up the PCI bdf of a device from sysfs without opening the chip"""
+    # The class device links to its PCI device, e.g. ../../../0000:01:00.0
+    return os.path.basename(
+        os.readlink(f"/sys/class/tenstorrent/tenstorrent!{interface_id}/device")
+    )
+
+
+class BHChipReset(ChipReset):
     """Class to perform a chip level reset on WH PCIe boards"""
 
     # WH magic numbers for reset
-    TENSTORRENT_IOCTL_MAGIC = 0xFA
-    TENSTORRENT_IOCTL_RESET_DEVICE = (TENSTORRENT_IOCTL_MAGIC << 8) | 6
-    TENSTORRENT_RESET_DEVICE_RESTORE_STATE = 0
-    TENSTORRENT_RESET_DEVICE_RESET_PCIE_LINK = 1
-    TENSTORRENT_RESET_DEVICE_CONFIG_WRITE = 2
     A3_STATE_PROP_TIME = 0.03
     POST_RESET_MSG_WAIT_TIME = 2
+    RESET_POLL_MIN_INTERVAL = 0.001
+    RESET_POLL_MAX_INTERVAL = 0.05
     MSG_TRIGGER_SPI_COPY_LtoR = 0x50
     MSG_TYPE_ARC_STATE3 = 0xA3
     MSG_TYPE_TRIGGER_RESET = 0x56
 
-    def reset_device_ioctl(self, interface_id: int, flags: int) -> bool:
-        dev_path = f"/dev/tenstorrent/{interface_id}"
-        dev_fd = os.open(
-            dev_path, os.O_RDWR | os.O_CLOEXEC
-        )  # Raises FileNotFoundError and other appropriate exceptions.
-        try:
-            reset_device_in_struct = "II"
-            reset_device_out_struct = "II"
-            reset_device_struct = reset_device_in_struct + reset_device_out_struct
-
-            input_size_bytes = struct.calcsize(reset_device_in_struct)
-            output_size_bytes = struct.calcsize(reset_device_out_struct)
-            reset_device_buf = bytearray(
-                struct.pack(reset_device_struct, output_size_bytes, flags, 0, 0)
-            )
-            fcntl.ioctl(
-                dev_fd, self.TENSTORRENT_IOCTL_RESET_DEVICE, reset_device_buf
-            )  # Raises OSError
-
-            output_buf = reset_device_buf[input_size_bytes:]
-            _, result = struct.unpack(reset_device_out_struct, output_buf)
-
-            return result == 0
-        finally:
-            os.close(dev_fd)
-
     def full_lds_reset(
         self, pci_interfaces: List[int], reset_m3: bool = False, silent: bool = False
     ) -> List[PciChip]:
         """Performs a full LDS reset of a list of chips"""
 
+        # Nothing to reset, skip the driver and platform checks entirely
+        if not pci_interfaces:
+            return []
+
         # TODO: FOR BH Check the driver version and bail if link reset cannot be supported
         # check_driver_version(operation="board reset")
 
         # Due to how Arm systems deal with PCIe device rescans, WH device resets don't work on that platform.
         # Check for platform and bail if it's Arm
-        platform = get_host_info()["Platform"]
-        if platform.startswith("arm") or platform.startswith("aarch"):
+        # Read through the module so patching chip_reset.IS_ARM_HOST applies here
+        if chip_reset.IS_ARM_HOST:
             print(
                 CMD_LINE_COLOR.RED,
                 "Cannot perform WH board reset on Arm systems, please reboot the system to reset the boards. Exiting...",
@@ -81,7 +66,7 @@ class BHChipReset:
             sys.exit(1)
 
         # Remove duplicates from the input list of PCI interfaces
-        pci_interfaces = list(set(pci_interfaces))
+        pci_interfaces = list(dict.fromkeys(pci_interfaces))
         if not silent:
             print(
                 f"{CMD_LINE_COLOR.BLUE} Starting PCI link reset on BH devices at PCI indices: {str(pci_interfaces)[1:-1]} {CMD_LINE_COLOR.ENDC}"
@@ -91,85 +76,101 @@ class BHChipReset:
 
         post_reset_wait = self.POST_RESET_MSG_WAIT_TIME
 
-        # Collect device bdf and trigger resets for all BH chips in order
-        for pci_interface in pci_interfaces:
-            # TODO: Make this check fallible
-            chip = PciChip(pci_interface=pci_interface)
-            pci_bdf = chip.get_pci_bdf()
-            pci_bdf_list[pci_interface] = pci_bdf
+        # Open each device once and reuse the fd for both the reset and restore ioctls
+        with ExitStack() as stack:
+            dev_fds = {
+                pci_interface: stack.enter_context(self._open_dev(pci_interface))
+                for pci_interface in pci_interfaces
+            }
+            # Collect device bdf for all BH chips before they go into reset
+            for pci_interface in pci_interfaces:
+                pci_bdf_list[pci_interface] = _bdf_for_interface(pci_interface)
+
             if reset_m3:
                 # A full bmfw upgrade can take awhile
                 post_reset_wait = 60
-                chip.arc_msg(self.MSG_TYPE_TRIGGER_RESET, wait_for_done=False, arg0=3)
+                # Only the m3 reset needs to talk to the chip before it goes down
+                for pci_interface in pci_interfaces:
+                    # TODO: Make this check fallible
+                    chip = PciChip(pci_interface=pci_interface)
+                    chip.arc_msg(
+                        self.MSG_TYPE_TRIGGER_RESET, wait_for_done=False, arg0=3
+                    )
             else:
-                self.reset_device_ioctl(
-                    pci_interface, self.TENSTORRENT_RESET_DEVICE_CONFIG_WRITE
+                # The config write resets are independent, issue them all at once
+                self.reset_devices_ioctl(
+                    dev_fds, self.TENSTORRENT_RESET_DEVICE_CONFIG_WRITE
                 )
 
-        # check command.memory in config space to see if reset bit is set
-        # 0 means config space reset happened correctly
-        # 1 means config space reset didn't go through correctly
-
-        completed = 0
-        failures = 0
-        files_map = {
-            pci_interface: open(
-                f"/sys/bus/pci/devices/{pci_bdf_list[pci_interface]}/config", "rb"
-            )
-            for pci_interface in pci_interfaces
-        }
-
-        elapsed = 0
-        start_time = time.time()
-        all_start_time = None
-        # Map of pci interface to reset bit
-        reset_complete_bit_map = {
-            pci_interface: False for pci_interface in pci_interfaces
-        }
-        can_early_exit = False
-
-        print(
-            f"Waiting for up to {post_reset_wait} seconds for asic to come back after reset"
-        )
-        while elapsed < post_reset_wait:
-            for pci_interface, file in files_map.items():
-                command_memory_byte = os.pread(file.fileno(), 1, 4)
-                reset_bit = (
-                    int.from_bytes(command_memory_byte, byteorder="little") >> 1
-                ) & 1
-                # Overwrite to store the last value
-                reset_complete_bit_map[pci_interface] = (
-                    True if reset_bit == 0 else False
+            # check command.memory in config space to see if reset bit is set
+            # 0 means config space reset happened correctly
+            # 1 means config space reset didn't go through correctly
+
+            completed = 0
+            failures = 0
+            # Open the config space of every device once, the fds are closed with the stack
+            config_fds = {}
+            for pci_interface in pci_interfaces:
+                config_fds[pci_interface] = os.open(
+                    _SYSFS_CONFIG_PATH_FMT(pci_bdf_list[pci_interface]),
+                    os.O_RDONLY | os.O_CLOEXEC,
                 )
+                stack.callback(os.close, config_fds[pci_interface])
 
-            # During bmfw upgrade it may take awhile for the asic to go down after sending the message.
-            # So to be safe only early exit if we know the asic has actually gone into reset
-            if not all(reset_complete_bit_map.values()):
-                can_early_exit = True
-
-            if all(reset_complete_bit_map.values()):
-                if can_early_exit:
-                    break
-
-            time.sleep(0.001)
-            elapsed = time.time() - start_time
-
-        # Check the last value of all the reset bits and report if any of them are not 0
-        for pci_interface in pci_interfaces:
-            if reset_complete_bit_map[pci_interface]:
-                print(
-                    f"{CMD_LINE_COLOR.GREEN} Config space reset completed for device {pci_interface} {CMD_LINE_COLOR.ENDC}"
-                )
-                completed += 1
-            else:
-                print(
-                    f"{CMD_LINE_COLOR.RED} Config space reset not completed for device {pci_interface}! {CMD_LINE_COLOR.ENDC}"
-                )
-                failures += 1
+            elapsed = 0
+            start_time = time.time()
+            all_start_time = None
+            # Map of pci interface to reset bit
+            reset_complete_bit_map = {
+                pci_interface: False for pci_interface in pci_interfaces
+            }
+            can_early_exit = False
 
-        for pci_interface in pci_interfaces:
-            self.reset_device_ioctl(
-                pci_interface, self.TENSTORRENT_RESET_DEVICE_RESTORE_STATE
+            print(
+                f"Waiting for up to {post_reset_wait} seconds for asic to come back after reset"
+            )
+            poll_interval = self.RESET_POLL_MIN_INTERVAL
+            while elapsed < post_reset_wait:
+                previous_bit_map = dict(reset_complete_bit_map)
+                for pci_interface, config_fd in config_fds.items():
+                    command_memory_byte = os.pread(config_fd, 1, 4)
+                    reset_bit = (command_memory_byte[0] >> 1) & 1
+                    # Overwrite to store the last value
+                    reset_complete_bit_map[pci_interface] = (
+                        True if reset_bit == 0 else False
+                    )
+
+                # During bmfw upgrade it may take awhile for the asic to go down after sending the message.
+                # So to be safe only early exit if we know the asic has actually gone into reset
+                if not all(reset_complete_bit_map.values()):
+                    can_early_exit = True
+
+                if all(reset_complete_bit_map.values()):
+                    if can_early_exit:
+                        break
+
+                # Back off while nothing changes, go back to fast polling as soon as a device changes state
+                if reset_complete_bit_map != previous_bit_map:
+                    poll_interval = self.RESET_POLL_MIN_INTERVAL
+                time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, self.RESET_POLL_MAX_INTERVAL)
+                elapsed = time.time() - start_time
+
+            # Check the last value of all the reset bits and report if any of them are not 0
+            for pci_interface in pci_interfaces:
+                if reset_complete_bit_map[pci_interface]:
+                    print(
+                        f"{CMD_LINE_COLOR.GREEN} Config space reset completed for device {pci_interface} {CMD_LINE_COLOR.ENDC}"
+                    )
+                    completed += 1
+                else:
+                    print(
+                        f"{CMD_LINE_COLOR.RED} Config space reset not completed for device {pci_interface}! {CMD_LINE_COLOR.ENDC}"
+                    )
+                    failures += 1
+
+            self.reset_devices_ioctl(
+                dev_fds, self.TENSTORRENT_RESET_DEVICE_RESTORE_STATE
             )
 
         if failures > 0:
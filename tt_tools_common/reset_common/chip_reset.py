@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: © 2024 Tenstorrent Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This file contains the tt-kmd reset ioctl plumbing shared by the PCIe chip resets.
+"""
+
+import os
+import fcntl
+import struct
+import platform
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# The host architecture can't change at runtime, so only check it once
+IS_ARM_HOST = platform.machine().lower().startswith(("arm", "aarch"))
+
+# Device node path, formatted for every device on each reset
+_DEV_PATH_FMT = "/dev/tenstorrent/{}".format
+
+# Layout of struct tenstorrent_reset_device, parsed once at import
+# in: (output_size_bytes, flags), out: (output_size_bytes, result)
+_RESET_DEVICE_STRUCT = struct.Struct("IIII")
+_RESET_DEVICE_OUT_SIZE = struct.calcsize("II")
+
+
+class ChipReset:
+    """Base class for chip level resets issued through the tt-kmd reset ioctl"""
+
+    # tt-kmd magic numbers for reset
+    TENSTORRENT_IOCTL_MAGIC = 0xFA
+    TENSTORRENT_IOCTL_RESET_DEVICE = (TENSTORRENT_IOCTL_MAGIC << 8) | 6
+    TENSTORRENT_RESET_DEVICE_RESTORE_STATE = 0
+    TENSTORRENT_RESET_DEVICE_RESET_PCIE_LINK = 1
+    TENSTORRENT_RESET_DEVICE_CONFIG_WRITE = 2
+
+    @contextmanager
+    def _open_dev(self, interface_id: int):
+        """Open the device node for an interface and close it on exit"""
+        dev_fd = os.open(
+            _DEV_PATH_FMT(interface_id), os.O_RDWR | os.O_CLOEXEC
+        )  # Raises FileNotFoundError and other appropriate exceptions.
+        try:
+            yield dev_fd
+        finally:
+            os.close(dev_fd)
+
+    def reset_device_ioctl(
+        self, interface_id: int, flags: int, fd: Optional[int] = None
+    ) -> bool:
+        # Callers issuing several ioctls on the same device can pass an already open fd
+        if fd is None:
+            with self._open_dev(interface_id) as dev_fd:
+                return self.reset_device_ioctl(interface_id, flags, dev_fd)
+
+        reset_device_buf = bytearray(_RESET_DEVICE_STRUCT.size)
+        _RESET_DEVICE_STRUCT.pack_into(
+            reset_device_buf, 0, _RESET_DEVICE_OUT_SIZE, flags, 0, 0
+        )
+        fcntl.ioctl(
+            fd, self.TENSTORRENT_IOCTL_RESET_DEVICE, reset_device_buf
+        )  # Raises OSError
+
+        _, _, _, result = _RESET_DEVICE_STRUCT.unpack_from(reset_device_buf)
+
+        return result == 0
+
+    def reset_devices_ioctl(self, dev_fds: Dict[int, int], flags: int) -> List[bool]:
+        """Issue the same reset ioctl to all open devices in parallel"""
+        with ThreadPoolExecutor(max_workers=max(len(dev_fds), 1)) as executor:
+            # Consuming the results re-raises any exception hit by a worker
+            return list(
+                executor.map(
+                    lambda item: self.reset_device_ioctl(item[0], flags, item[1]),
+                    dev_fds.items(),
+                )
+            )
@@ -8,6 +8,7 @@ This file contains functions used to do a galaxy reset.
 import sys
 import threading
 import requests
+from requests.adapters import HTTPAdapter
 import time
 from typing import Optional
 from tqdm import tqdm
@@ -20,6 +21,20 @@ from tt_tools_common.ui_common.themes import CMD_LINE_COLOR
 class GalaxyReset:
     """Class to perform galaxy reset operations"""
 
+    # Seconds between boot progress bar redraws while the progress is unchanged
+    BOOT_PROGRESS_REFRESH_INTERVAL = 5
+
+    def __init__(self):
+        # Server versions don't change during a reset, so only ask each mobo once
+        # it has answered
+        self._server_version_cache = {}
+        # Share one keep-alive session for all mobo server traffic instead of a new
+        # connection per request, the boot progress poll hits every mobo once a second
+        self._session = requests.Session()
+        self._session.mount(
+            "http://", HTTPAdapter(pool_connections=32, pool_maxsize=32)
+        )
+
     def threaded_mobo_reset(self, mobo_dict_list, function, args=()):
         """Threaded function to perform mobo reset operations concurrently"""
 
@@ -66,17 +81,22 @@ class GalaxyReset:
         return url, auth
 
     def get_server_version(self, mobo):
+        if mobo in self._server_version_cache:
+            return self._server_version_cache[mobo]
+
         # Try to get the server version, but some servers may not have the /about endpoint so defaulting to 0.0.0
         response_url, response_auth = self.mobo_address_generator(mobo, "about")
         try:
-            response = requests.get(response_url, auth=response_auth, timeout=30)
+            response = self._session.get(response_url, auth=response_auth, timeout=30)
             response.raise_for_status()
 
             response = response.json()
             server_version = tuple(map(int, response["version"].split(".")))
         except Exception:
-            server_version = (0, 0, 0)
+            # Not cached, a transient failure shouldn't pin the mobo to the fallback
+            return (0, 0, 0)
 
+        self._server_version_cache[mobo] = server_version
         return server_version
 
     def server_communication(
@@ -90,9 +110,9 @@ class GalaxyReset:
         """Function to communicate with the server and handle errors and exceptions"""
         response_url, response_auth = self.mobo_address_generator(mobo, command)
         if post:
-            response = requests.post(response_url, auth=response_auth, json=data)
+            response = self._session.post(response_url, auth=response_auth, json=data)
         else:
-            response = requests.get(
+            response = self._session.get(
                 response_url,
                 auth=response_auth,
             )
@@ -179,6 +199,10 @@ class GalaxyReset:
         progress_bar.set_description_str(
             f"{mobo} - Waiting for server boot to complete... {boot_progress:6.2f}%"
         )
+        # Last values shown, the server can report the same progress for a long time
+        last_progress = boot_progress
+        last_extra_info = ""
+        last_draw = time_start
         while boot_progress < 100.0:
             if time.time() - time_start > timeout:
                 raise Exception(
@@ -195,9 +219,19 @@ class GalaxyReset:
             else:
                 extra_info = ""
 
-            progress_bar.set_description_str(
-                f"{mobo} - Waiting for server boot to complete... {boot_progress:6.2f}%{extra_info}"
-            )
+            # Only rebuild the description when there is something new to show
+            if boot_progress != last_progress or extra_info != last_extra_info:
+                progress_bar.set_description_str(
+                    f"{mobo} - Waiting for server boot to complete... {boot_progress:6.2f}%{extra_info}"
+                )
+                last_progress = boot_progress
+                last_extra_info = extra_info
+                last_draw = time.time()
+            elif time.time() - last_draw >= self.BOOT_PROGRESS_REFRESH_INTERVAL:
+                # tqdm only redraws on updates, refresh now and then so the elapsed time
+                # still moves while the progress is stuck
+                progress_bar.refresh()
+                last_draw = time.time()
             time.sleep(1)
 
     def shutdown_modules(self, mobo_dict):
@@ -246,7 +280,7 @@ class GalaxyReset:
                 nb_host_pci_idx_list.extend(entry["nb_host_pci_idx"])
         if nb_host_pci_idx_list:
             # remove duplicate entries
-            nb_host_pci_idx_list = list(set(nb_host_pci_idx_list))
+            nb_host_pci_idx_list = list(dict.fromkeys(nb_host_pci_idx_list))
             WHChipReset().full_lds_reset(nb_host_pci_idx_list)
 
         # Boot modules after reset
@@ -6,6 +6,7 @@ This file contains functions used to generate host logs that are compatible with
 """
 
 from __future__ import annotations
+import copy
 import json
 import base64
 import inspect
@@ -65,24 +66,28 @@ def optional(*fields):
     return dec
 
 
+# Leaf types that map straight to a fixed elasticsearch type, keyed on the class itself
+# so that a lookup along the MRO finds the most specific match first (e.g. bool before int)
+_DIRECT_MAP = {
+    float: {"type": "float"},
+    bool: {"type": "boolean"},
+    Long: {"type": "long"},
+    int: {"type": "integer"},
+    bytes: {"type": "binary"},
+    Keyword: {"type": "keyword"},
+    Text: {"type": "text"},
+}
+
+
 def type_to_mapping(type: Any):
     """Converts a python type to an elasticsearch mapping type"""
 
-    if issubclass(type, float):
-        return {"type": "float"}
-    elif issubclass(type, bool):
-        return {"type": "boolean"}
-    elif issubclass(type, Long):
-        return {"type": "long"}
-    elif issubclass(type, int):
-        return {"type": "integer"}
-    elif issubclass(type, bytes):
-        return {"type": "binary"}
-    elif issubclass(type, Keyword):
-        return {"type": "keyword"}
-    elif issubclass(type, Text):
-        return {"type": "text"}
-    elif issubclass(type, str):
+    for base in type.__mro__:
+        if base in _DIRECT_MAP:
+            # Hand out a copy, callers are free to modify the mapping they get back
+            return _DIRECT_MAP[base].copy()
+
+    if issubclass(type, str):
         return {"type": "text", "fields": {"keyword": {"type": "keyword"}}}
     elif issubclass(type, Date):
         return type.get_mapping()
@@ -116,6 +121,15 @@ def field_to_mapping(info: Field):
         ) from exc
 
 
+def json_default(obj):
+    """Converts the non json-native values in a model dump, the inverse of json_load_bytes"""
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return {"__type__": "bytes", "bytes": base64.b64encode(obj).decode("ascii")}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
 def json_load_bytes(obj):
     """Converts a json object to bytes"""
     if "__type__" in obj:
@@ -129,11 +143,17 @@ class ElasticModel(BaseModel):
 
     @classmethod
     def get_mapping(cls):
-        mapping = {}
-        for name, info in cls.__fields__.items():
-            mapping[name] = field_to_mapping(info)
-
-        return mapping
+        # The mapping is fixed per class, so only build it once.
+        # Look in cls.__dict__ so a subclass doesn't pick up its parent's mapping
+        if "_cached_mapping" not in cls.__dict__:
+            mapping = {}
+            for name, info in cls.__fields__.items():
+                mapping[name] = field_to_mapping(info)
+            cls._cached_mapping = mapping
+
+        # Hand out a deep copy, the mapping is nested into parent mappings and
+        # callers are free to modify it without touching the cache
+        return copy.deepcopy(cls._cached_mapping)
 
     # Will add the ability to save to elasticsearch as needed
     # def save(self, index: str):
@@ -177,6 +197,4 @@ class HostResetLog(ElasticModel):
 
     def save_as_json(self, fname: Union[str, Path]):
         with open(fname, "w") as f:
-            raw_json = self.json(exclude_none=False)
-            reloaded_json = json.loads(raw_json)
-            json.dump(reloaded_json, f, indent=4)
+            json.dump(self.dict(exclude_none=False), f, indent=4, default=json_default)
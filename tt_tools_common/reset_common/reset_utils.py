@@ -13,10 +13,20 @@ from pathlib import Path
 import tt_tools_common.reset_common.host_reset_log as log
 from tt_tools_common.ui_common.themes import CMD_LINE_COLOR
 from tt_tools_common.utils_common.system_utils import get_host_info
-from tt_tools_common.utils_common.tools_utils import init_logging
+from tt_tools_common.utils_common.tools_utils import classify_devices, init_logging
 
 LOG_FOLDER = os.path.expanduser("~/.config/tenstorrent")
 
+# Placeholder credo ids written to the sample mobo reset config
+_SAMPLE_CREDO_IDS = ("<group id>:<credo id>", "<group id>:<credo id>")
+
+
+def _ensure_log_folder():
+    """Create the default log folder if it's missing"""
+    # Not cached, the folder may be removed while a tool is running and the stat is cheap
+    if not os.path.exists(LOG_FOLDER):
+        init_logging(LOG_FOLDER)
+
 
 def generate_reset_logs(devices, result_filename: str = None):
     """
@@ -26,32 +36,24 @@ def generate_reset_logs(devices, result_filename: str = None):
     """
 
     time_now = datetime.datetime.now()
-    gs_pci_idx = []
-    wh_pci_idx = []
-    for i, dev in enumerate(devices):
-        if dev.as_wh() and not dev.is_remote():
-            wh_pci_idx.append(dev.get_pci_interface_id())
-        elif dev.as_gs():
-            gs_pci_idx.append(dev.get_pci_interface_id())
+    classified = classify_devices(devices)
+    gs_pci_idx = classified["gs"]
+    wh_pci_idx = classified["wh"]
     reset_log = log.HostResetLog(
         time=time_now,
         host_name=get_host_info()["Hostname"],
         gs_tensix_reset=log.PciResetDeviceInfo(pci_index=gs_pci_idx),
         wh_link_reset=log.PciResetDeviceInfo(pci_index=wh_pci_idx),
         re_init_devices=True,
+        # Two sample mobo entries for the user to fill in
         wh_mobo_reset=[
             log.MoboReset(
                 nb_host_pci_idx=wh_pci_idx,
                 mobo="<MOBO NAME>",
-                credo=["<group id>:<credo id>", "<group id>:<credo id>"],
-                disabled_ports=["<group id>:<credo id>", "<group id>:<credo id>"],
-            ),
-            log.MoboReset(
-                nb_host_pci_idx=wh_pci_idx,
-                mobo="<MOBO NAME>",
-                credo=["<group id>:<credo id>", "<group id>:<credo id>"],
-                disabled_ports=["<group id>:<credo id>", "<group id>:<credo id>"],
-            ),
+                credo=list(_SAMPLE_CREDO_IDS),
+                disabled_ports=list(_SAMPLE_CREDO_IDS),
+            )
+            for _ in range(2)
         ],
     )
     if result_filename:
@@ -60,14 +62,27 @@ def generate_reset_logs(devices, result_filename: str = None):
         log_filename = result_filename
     else:
         log_filename = f"{LOG_FOLDER}/reset_config.json"
-        if not os.path.exists(LOG_FOLDER):
-            init_logging(LOG_FOLDER)
+        _ensure_log_folder()
     reset_log.save_as_json(log_filename)
     return log_filename
 
 
 def parse_reset_input(value):
     """Validate the reset inputs - either list of int PCI IDs or a json config file"""
+    # A list of comma separated integers is the common case, try it before touching the filesystem
+    try:
+        return [int(item) for item in value.split(",")]
+    except ValueError:
+        pass
+
+    if not os.path.isfile(value):
+        print(
+            CMD_LINE_COLOR.RED,
+            "Invalid input! Provide list of comma separated numbers or a json file.\n To generate a reset json config file run tt-smi -g",
+            CMD_LINE_COLOR.ENDC,
+        )
+        sys.exit(1)
+
     try:
         # Attempt to parse as a JSON file
         with open(value, "r") as json_file:
@@ -80,14 +95,3 @@ def parse_reset_input(value):
             CMD_LINE_COLOR.ENDC,
         )
         sys.exit(1)
-    except FileNotFoundError:
-        # If no file found, attempt to parse as a list of comma separated integers
-        try:
-            return [int(item) for item in value.split(",")]
-        except ValueError:
-            print(
-                CMD_LINE_COLOR.RED,
-                "Invalid input! Provide list of comma separated numbers or a json file.\n To generate a reset json config file run tt-smi -g",
-                CMD_LINE_COLOR.ENDC,
-            )
-            sys.exit(1)
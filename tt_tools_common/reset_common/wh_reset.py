@@ -5,73 +5,57 @@
 This file contains functions used to do a PCIe level reset for Wormhole chip.
 """
 
-import os
 import sys
 import time
-import fcntl
-import struct
 from typing import List
+from contextlib import ExitStack
 from pyluwen import PciChip
 from tt_tools_common.ui_common.themes import CMD_LINE_COLOR
+from tt_tools_common.reset_common import chip_reset
+from tt_tools_common.reset_common.chip_reset import ChipReset
 from tt_tools_common.utils_common.tools_utils import read_refclk_counter
 from tt_tools_common.utils_common.system_utils import (
     check_driver_version,
-    get_host_info,
 )
 
 
-class WHChipReset:
+class WHChipReset(ChipReset):
     """Class to perform a chip level reset on WH PCIe boards"""
 
     # WH magic numbers for reset
-    TENSTORRENT_IOCTL_MAGIC = 0xFA
-    TENSTORRENT_IOCTL_RESET_DEVICE = (TENSTORRENT_IOCTL_MAGIC << 8) | 6
-    TENSTORRENT_RESET_DEVICE_RESTORE_STATE = 0
-    TENSTORRENT_RESET_DEVICE_RESET_PCIE_LINK = 1
     A3_STATE_PROP_TIME = 0.03
     POST_RESET_MSG_WAIT_TIME = 2
     MSG_TRIGGER_SPI_COPY_LtoR = 0x50
     MSG_TYPE_ARC_STATE3 = 0xA3
     MSG_TYPE_TRIGGER_RESET = 0x56
 
-    def reset_device_ioctl(self, interface_id: int, flags: int) -> bool:
-        dev_path = f"/dev/tenstorrent/{interface_id}"
-        dev_fd = os.open(
-            dev_path, os.O_RDWR | os.O_CLOEXEC
-        )  # Raises FileNotFoundError and other appropriate exceptions.
-        try:
-            reset_device_in_struct = "II"
-            reset_device_out_struct = "II"
-            reset_device_struct = reset_device_in_struct + reset_device_out_struct
-
-            input_size_bytes = struct.calcsize(reset_device_in_struct)
-            output_size_bytes = struct.calcsize(reset_device_out_struct)
-            reset_device_buf = bytearray(
-                struct.pack(reset_device_struct, output_size_bytes, flags, 0, 0)
-            )
-            fcntl.ioctl(
-                dev_fd, self.TENSTORRENT_IOCTL_RESET_DEVICE, reset_device_buf
-            )  # Raises OSError
-
-            output_buf = reset_device_buf[input_size_bytes:]
-            _, result = struct.unpack(reset_device_out_struct, output_buf)
-
-            return result == 0
-        finally:
-            os.close(dev_fd)
+    def _trigger_chip_reset(self, chip: PciChip, reset_m3: bool):
+        """Send the reset arc messages to a single chip"""
+        # Trigger A3 safe state. A3 is a safe state where there are no more pending regulator requests.
+        chip.arc_msg(self.MSG_TYPE_ARC_STATE3, wait_for_done=True)
+        time.sleep(self.A3_STATE_PROP_TIME)
+        # Triggers M3 board level reset by sending arc msg.
+        if reset_m3:
+            chip.arc_msg(self.MSG_TYPE_TRIGGER_RESET, wait_for_done=False, arg0=3)
+        else:
+            chip.arc_msg(self.MSG_TYPE_TRIGGER_RESET, wait_for_done=False)
 
     def full_lds_reset(
         self, pci_interfaces: List[int], reset_m3: bool = False, silent: bool = False
     ) -> List[PciChip]:
         """Performs a full LDS reset of a list of chips"""
 
+        # Nothing to reset, skip the driver and platform checks entirely
+        if not pci_interfaces:
+            return []
+
         # Check the driver version and bail if link reset cannot be supported
         check_driver_version(operation="board reset")
 
         # Due to how Arm systems deal with PCIe device rescans, WH device resets don't work on that platform.
         # Check for platform and bail if it's Arm
-        platform = get_host_info()["Platform"]
-        if platform.startswith("arm") or platform.startswith("aarch"):
+        # Read through the module so patching chip_reset.IS_ARM_HOST applies here
+        if chip_reset.IS_ARM_HOST:
             print(
                 CMD_LINE_COLOR.RED,
                 "Cannot perform WH board reset on Arm systems, please reboot the system to reset the boards. Exiting...",
@@ -80,56 +64,72 @@ class WHChipReset:
             sys.exit(1)
 
         # Remove duplicates from the input list of PCI interfaces
-        pci_interfaces = list(set(pci_interfaces))
+        pci_interfaces = list(dict.fromkeys(pci_interfaces))
         if not silent:
             print(
                 f"{CMD_LINE_COLOR.BLUE} Starting PCI link reset on WH devices at PCI indices: {str(pci_interfaces)[1:-1]} {CMD_LINE_COLOR.ENDC}"
             )
 
-        for pci_interface in pci_interfaces:
-            self.reset_device_ioctl(
-                pci_interface, self.TENSTORRENT_RESET_DEVICE_RESET_PCIE_LINK
+        # Open each device once and reuse the fd for both the link reset and restore ioctls
+        with ExitStack() as stack:
+            dev_fds = {
+                pci_interface: stack.enter_context(self._open_dev(pci_interface))
+                for pci_interface in pci_interfaces
+            }
+            self.reset_devices_ioctl(
+                dev_fds, self.TENSTORRENT_RESET_DEVICE_RESET_PCIE_LINK
             )
-        pci_chips = [PciChip(pci_interface=interface) for interface in pci_interfaces]
-        refclk_list = []
-        fail = False
-        # Trigger resets for all chips in order
-        for chip in pci_chips:
-            # Collect the arc refclk for the chip before sending reset arc messages
-            try:
-                refclk_list.append(read_refclk_counter(chip))
-            except Exception as e:
-                # If we get to this point means ioctl reset isn't enough to reset the chip
-                # This is a fatal error, we should exit and recommend user to reboot the system
-                print(
-                    CMD_LINE_COLOR.RED,
-                    "Failed to recover WH chip, please reboot the system to reset the chip. Exiting...",
-                    CMD_LINE_COLOR.ENDC,
-                )
-                sys.exit(1)
-            # Trigger A3 safe state. A3 is a safe state where there are no more pending regulator requests.
-            chip.arc_msg(self.MSG_TYPE_ARC_STATE3, wait_for_done=True)
-            time.sleep(self.A3_STATE_PROP_TIME)
-            # Triggers M3 board level reset by sending arc msg.
-            if reset_m3:
-                chip.arc_msg(self.MSG_TYPE_TRIGGER_RESET, wait_for_done=False, arg0=3)
-            else:
-                chip.arc_msg(self.MSG_TYPE_TRIGGER_RESET, wait_for_done=False)
-
-        time.sleep(self.POST_RESET_MSG_WAIT_TIME)
-
-        for i, (chip, pci_interface) in enumerate(zip(pci_chips, pci_interfaces)):
-            self.reset_device_ioctl(
-                pci_interface, self.TENSTORRENT_RESET_DEVICE_RESTORE_STATE
+            pci_chips = [
+                PciChip(pci_interface=interface) for interface in pci_interfaces
+            ]
+            refclk_list = []
+            fail = False
+            # Collect the arc refclk for every chip before sending any reset arc messages,
+            # so no chip is left mid reset if one of them can't be read
+            for chip in pci_chips:
+                try:
+                    refclk_list.append(read_refclk_counter(chip))
+                except Exception:
+                    # If we get to this point means ioctl reset isn't enough to reset the chip
+                    # This is a fatal error, we should exit and recommend user to reboot the system
+                    print(
+                        CMD_LINE_COLOR.RED,
+                        "Failed to recover WH chip, please reboot the system to reset the chip. Exiting...",
+                        CMD_LINE_COLOR.ENDC,
+                    )
+                    sys.exit(1)
+            # pyluwen chips aren't known to be safe to drive from other threads, so the
+            # arc messages stay serial, only the reset ioctls are issued in parallel
+            trigger_errors = {}
+            for chip, pci_interface in zip(pci_chips, pci_interfaces):
+                try:
+                    self._trigger_chip_reset(chip, reset_m3)
+                except Exception as e:
+                    # Keep going so every chip still gets its state restored below
+                    trigger_errors[pci_interface] = e
+
+            time.sleep(self.POST_RESET_MSG_WAIT_TIME)
+
+            self.reset_devices_ioctl(
+                dev_fds, self.TENSTORRENT_RESET_DEVICE_RESTORE_STATE
             )
-            current_refclk = read_refclk_counter(chip)
-            if refclk_list[i] < current_refclk:
-                print(
-                    CMD_LINE_COLOR.RED,
-                    f"Reset for PCI {pci_interface} didn't go through! Refclk didn't reset. Value before: {refclk_list[i]}, value after: {current_refclk}",
-                    CMD_LINE_COLOR.ENDC,
-                )
-                fail = True
+            for i, (chip, pci_interface) in enumerate(zip(pci_chips, pci_interfaces)):
+                if pci_interface in trigger_errors:
+                    print(
+                        CMD_LINE_COLOR.RED,
+                        f"Failed to send reset messages to PCI {pci_interface}: {trigger_errors[pci_interface]}",
+                        CMD_LINE_COLOR.ENDC,
+                    )
+                    fail = True
+                    continue
+                current_refclk = read_refclk_counter(chip)
+                if refclk_list[i] < current_refclk:
+                    print(
+                        CMD_LINE_COLOR.RED,
+                        f"Reset for PCI {pci_interface} didn't go through! Refclk didn't reset. Value before: {refclk_list[i]}, value after: {current_refclk}",
+                        CMD_LINE_COLOR.ENDC,
+                    )
+                    fail = True
 
         if fail:
             print(
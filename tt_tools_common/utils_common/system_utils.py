@@ -4,17 +4,72 @@
 """
 This file contains common utilities used by all tt-tools.
 """
+import os
+import re
 import sys
 import json
 import psutil
+import functools
 import distro
 import platform
 import requests
+from types import MappingProxyType
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union, Tuple, Dict
 from tt_tools_common.ui_common.themes import CMD_LINE_COLOR
 
 MINIMUM_DRIVER_VERSION_LDS_RESET = 26
 
+# Binary size prefixes used by get_size
+SIZE_UNITS = ("", "K", "M", "G", "T", "P")
+
+# Software versions reported when the lookup is disabled
+DEFAULT_SW_VER = MappingProxyType(
+    {
+        "Firmware Bundle": "N/A",
+        "tt-smi": "N/A",
+        "tt-flash": "N/A",
+        "tt-kmd": "N/A",
+        "TT-Buda": "N/A",
+        "TT-Metalium": "N/A",
+    }
+)
+# Versions added to every successful lookup, under their user-facing names
+_EXTRA_SW_VERSIONS = (("TT-Metalium", "0.42.0"), ("TT-Buda", "0.9.80"))
+
+# (connect, read) timeouts in seconds for the software version lookup
+SW_VER_TIMEOUT = (3, 5)
+# Upper bound on concurrent software version lookups
+SW_VER_MAX_WORKERS = 8
+
+# Shared session so lookups for several boards reuse their connections,
+# with room in the pool for one connection per concurrent lookup
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "tt-tools-common"})
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=SW_VER_MAX_WORKERS,
+        pool_maxsize=SW_VER_MAX_WORKERS,
+        # Ride out brief gateway errors, the last response is still handed back as is.
+        # Only status codes are retried: a failed connect isn't retried, and read=False
+        # re-raises a read timeout as is so it still reaches us as Timeout
+        max_retries=Retry(
+            total=2,
+            connect=0,
+            read=False,
+            backoff_factor=0.1,
+            status_forcelist=[502, 503, 504],
+            raise_on_status=False,
+        ),
+    ),
+)
+
+# major[.minor[.patch]], anything after that (e.g. the -bh extraversion) is ignored
+VERSION_REGEXP = re.compile(r"^(\d+)(?:\.(\d+))?(?:\.(\d+))?")
+
 
 def get_size(size_bytes: int, suffix: str = "B") -> str:
     """
@@ -23,27 +78,57 @@ def get_size(size_bytes: int, suffix: str = "B") -> str:
         1253656 => '1.20MB'
         1253656678 => '1.17GB'
     """
-    factor = 1024
-    for unit in ["", "K", "M", "G", "T", "P"]:
-        if size_bytes < factor:
-            return f"{size_bytes:.2f} {unit}{suffix}"
-        size_bytes /= factor
-    return "N/A"
+    # Each unit is 1024 (2**10) times the previous one, so the unit index
+    # is the number of whole 10 bit steps in the size
+    shift = max(int(size_bytes).bit_length() - 1, 0) // 10
+    if shift >= len(SIZE_UNITS):
+        return "N/A"
+    return f"{size_bytes / (1 << (10 * shift)):.2f} {SIZE_UNITS[shift]}{suffix}"
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_version_string(version: str) -> Tuple[int, int, int]:
+    """
+    Parse a driver version string such as 1.28 or 1.28-bh into a (major, minor, patch) tuple
+    """
+    m = VERSION_REGEXP.match(version)
+    if m is None:
+        raise ValueError(f"Invalid version string: {version!r}")
+    return int(m.group(1)), int(m.group(2) or 0), int(m.group(3) or 0)
 
 
+@functools.lru_cache(maxsize=1)
 def get_driver_version() -> Union[str, None]:
     """
     Get the version of the Tenstorrent driver
+    The result is cached, call get_driver_version.cache_clear() to re-read it
     """
     try:
-        with open("/sys/module/tenstorrent/version", "r", encoding="utf-8") as f:
-            driver = f.readline().rstrip()
+        # The sysfs file is a single short line, read it without the buffered text io stack
+        fd = os.open("/sys/module/tenstorrent/version", os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            data = os.read(fd, 64)
+        finally:
+            os.close(fd)
+        driver = data.decode("utf-8").partition("\n")[0].rstrip()
     except Exception:
         driver = None
 
     return driver
 
 
+def invalidate_driver_cache():
+    """
+    Drop the cached driver version so the next check re-reads it from sysfs
+    Needed if the driver is reloaded while a tool is running
+    """
+    get_driver_version.cache_clear()
+    _parse_version_string.cache_clear()
+    # The host info and compatibility checklist include the driver version
+    _read_host_info.cache_clear()
+    _read_host_compatibility_info.cache_clear()
+
+
 def check_driver_version(
     operation: str, minimum_driver_version: str = MINIMUM_DRIVER_VERSION_LDS_RESET
 ):
@@ -59,7 +144,7 @@ def check_driver_version(
             CMD_LINE_COLOR.ENDC,
         )
         sys.exit(1)
-    if int(driver.split("-")[0].split(".")[1]) < minimum_driver_version:
+    if _parse_version_string(driver)[1] < minimum_driver_version:
         print(
             CMD_LINE_COLOR.RED,
             f"Current driver version: {driver}",
@@ -84,11 +169,29 @@ def get_host_info() -> dict:
     Returns:
         dict: with host info
     """
+    # Hand out a copy so callers can't modify the cached info
+    return dict(_read_host_info())
+
+
+@functools.lru_cache(maxsize=1)
+def _memory_total_bytes() -> int:
+    """Total physical memory of the host, it doesn't change at runtime"""
+    return psutil.virtual_memory().total
+
+
+@functools.lru_cache(maxsize=1)
+def _distro_info() -> Tuple[str, str, Tuple[str, str, str]]:
+    """Distro id, pretty name and version parts, read from os-release once"""
+    return distro.id(), distro.name(pretty=True), distro.version_parts()
+
+
+@functools.lru_cache(maxsize=1)
+def _read_host_info() -> dict:
+    """None of the host info changes while a tool is running, so only read it once"""
     uname = platform.uname()
-    svmem = psutil.virtual_memory()
 
     os: str = uname.system
-    distro_name: str = distro.name(pretty=True)
+    distro_name: str = _distro_info()[1]
     kernel: str = uname.release
     hostname: str = uname.node
 
@@ -99,10 +202,11 @@ def get_host_info() -> dict:
         "Hostname": hostname,
         "Platform": uname.machine,
         "Python": platform.python_version(),
-        "Memory": get_size(svmem.total),
+        "Memory": get_size(_memory_total_bytes()),
         "Driver": "TT-KMD " + get_driver_version(),
     }
 
+
 def get_host_compatibility_info() -> Dict[str, Union[str, Tuple]]:
     """
     Return host info with system compatibility notes
@@ -112,7 +216,14 @@ def get_host_compatibility_info() -> Dict[str, Union[str, Tuple]]:
     not. The first element is the current state and the
     second element is the desired or recommended state.
     """
-    host_info = get_host_info()
+    # Hand out a copy so callers can't modify the cached checklist
+    return dict(_read_host_compatibility_info())
+
+
+@functools.lru_cache(maxsize=1)
+def _read_host_compatibility_info() -> Dict[str, Union[str, Tuple]]:
+    """All of the checked host info is fixed at runtime, so only build the checklist once"""
+    host_info = _read_host_info()
     checklist = {}
     full_os = f"{host_info['OS']} ({host_info['Platform']})"
 
@@ -121,9 +232,11 @@ def get_host_compatibility_info() -> Dict[str, Union[str, Tuple]]:
     else:
         checklist["OS"] = (full_os, "Linux (x86_64)")
 
-    if distro.id() == "ubuntu":
-        distro_version = float(".".join(distro.version_parts()[:2]))
-        if distro_version >= 20.04:
+    distro_id, _, distro_version_parts = _distro_info()
+    if distro_id == "ubuntu":
+        major, minor = distro_version_parts[:2]
+        # Compare as integers, a float only works while the minor version has two digits
+        if (int(major or 0), int(minor or 0)) >= (20, 4):
             checklist["Distro"] = host_info["Distro"]
         else:
             checklist["Distro"] = (host_info["Distro"], "20.04 or 22.04")
@@ -134,7 +247,7 @@ def get_host_compatibility_info() -> Dict[str, Union[str, Tuple]]:
     checklist["Hostname"] = host_info["Hostname"]
     checklist["Python"] = host_info["Python"]
 
-    if psutil.virtual_memory().total >= 32 * 1e9:
+    if _memory_total_bytes() >= 32 * 1e9:
         checklist["Memory"] = host_info["Memory"]
     else:
         checklist["Memory"] = (host_info["Memory"], "32GB+")
@@ -147,6 +260,49 @@ def get_host_compatibility_info() -> Dict[str, Union[str, Tuple]]:
     return checklist
 
 
+def _fetch_sw_ver(board_id: str) -> Dict[str, str]:
+    """
+    Look up the software versions for a single board.
+    Returns the versions, or a "Failed to fetch" entry describing what went wrong.
+    """
+    version = {}
+    url = "https://cereal.tenstorrent.com?SerialNumber=" + board_id
+    try:
+        r = _SESSION.get(url, timeout=SW_VER_TIMEOUT)
+
+        try:
+            r_text = r.json()
+        except json.JSONDecodeError:
+            print("Error decoding json")
+            version["Failed to fetch"] = "No response from server"
+        else:
+            if isinstance(r_text, dict):
+                version.update(
+                    {
+                        key: value
+                        for key, value in r_text.items()
+                        if isinstance(key, str) and isinstance(value, str)
+                    }
+                )
+                version.update(_EXTRA_SW_VERSIONS)
+            else:
+                version["Failed to fetch"] = "Unexpected response from server"
+    except requests.exceptions.HTTPError:
+        version["Failed to fetch"] = "We encountered an HTTP error."
+    # Checked before ConnectionError so connect and read timeouts are reported the same way
+    except requests.exceptions.Timeout:
+        version["Failed to fetch"] = (
+            "Timeout error. It seems the server is taking too long to respond."
+        )
+    except requests.exceptions.ConnectionError:
+        version["Failed to fetch"] = (
+            "There was an error connecting to the server. Please check your internet connection."
+        )
+    except requests.exceptions.RequestException:
+        version["Failed to fetch"] = "Something unexpected happened."
+    return version
+
+
 def get_sw_ver_info(show_sw_ver: bool, board_ids: str):
     # TODO: Implement call to server to pull latest SW versions
     """
@@ -155,52 +311,19 @@ def get_sw_ver_info(show_sw_ver: bool, board_ids: str):
     Args:
         show_sw_ver (bool): Whether to show software version info. Will default to N/A if False.
     """
-    sw_ver = {
-        "Firmware Bundle": "N/A",
-        "tt-smi": "N/A",
-        "tt-flash": "N/A",
-        "tt-kmd": "N/A",
-        "TT-Buda": "N/A",
-        "TT-Metalium": "N/A",
-    }
+    # The lookups would be thrown away, don't make them at all
+    if not show_sw_ver:
+        return dict(DEFAULT_SW_VER)
+
     version = {}
-    for board_id in board_ids:
-        url = "https://cereal.tenstorrent.com?SerialNumber=" + board_id
-        try:
-            r = requests.get(url)
+    board_ids = list(board_ids)
+    if board_ids:
+        # The lookups are independent, run them concurrently over the shared session
+        with ThreadPoolExecutor(
+            max_workers=min(SW_VER_MAX_WORKERS, len(board_ids))
+        ) as executor:
+            # Merge in board order so later boards win, as in the serial loop
+            for board_version in executor.map(_fetch_sw_ver, board_ids):
+                version.update(board_version)
 
-            try:
-                r_text = r.json()
-            except json.JSONDecodeError:
-                print("Error decoding json")
-                version["Failed to fetch"] = "No response from server"
-            else:
-                if isinstance(r_text, dict):
-                    for key, value in r_text.items():
-                        if isinstance(value, str) and isinstance(key, str):
-                            version.update({key: value})
-                    version.update({"Buda": "0.9.80", "Metallium": "0.42.0"})
-                    # Fix up the keys with user-facing names
-                    version["TT-Metalium"] = version["Metallium"]
-                    del version["Metallium"]
-                    version["TT-Buda"] = version["Buda"]
-                    del version["Buda"]
-                else:
-                    version["Failed to fetch"] = "Unexpected response from server"
-        except requests.exceptions.HTTPError:
-            version["Failed to fetch"] = "We encountered an HTTP error."
-        except requests.exceptions.ConnectionError:
-            version["Failed to fetch"] = (
-                "There was an error connecting to the server. Please check your internet connection."
-            )
-        except requests.exceptions.Timeout:
-            version["Failed to fetch"] = (
-                "Timeout error. It seems the server is taking too long to respond."
-            )
-        except requests.exceptions.RequestException:
-            version["Failed to fetch"] = "Something unexpected happened."
-
-    if show_sw_ver:
-        return version
-
-    return sw_ver
+    return version
@@ -5,42 +5,117 @@
 This file contains common utilities used by all tt-tools.
 """
 import os
+import re
 import sys
 import time
-from typing import List
+import functools
+from typing import Dict, List, Optional, Tuple
 import importlib.resources
-from yaml import safe_load
+from yaml import load
 from pyluwen import PciChip, detect_chips_fallible
 from tt_tools_common.ui_common.themes import CMD_LINE_COLOR
 
+try:
+    # Use the LibYAML based parser when pyyaml was built with it
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
+# Matches the (...) group in the ETH chip detection status lines
+PAREN_REGEXP = re.compile(r"\((.*?)\)")
+
+# Chips that ship a data directory with the tools
+SUPPORTED_DATA_CHIPS = frozenset({"wormhole", "grayskull"})
+
+# Chip detection spinner, four frames so the frame is picked with & 3
+_SPINNER = ("\\", "|", "/", "-")
+# Fully colored ARC and DRAM detection lines, one per spinner frame
+_ARC_SPIN = tuple(
+    f"\r{CMD_LINE_COLOR.BLUE} Detecting ARC: {CMD_LINE_COLOR.YELLOW}{c}{CMD_LINE_COLOR.ENDC}"
+    for c in _SPINNER
+)
+_DRAM_SPIN = tuple(
+    f"\r{CMD_LINE_COLOR.BLUE} Detecting DRAM: {CMD_LINE_COLOR.YELLOW}{c}{CMD_LINE_COLOR.ENDC}"
+    for c in _SPINNER
+)
+
+
+@functools.lru_cache(maxsize=None)
 def init_fw_defines(chip_name: str = "wormhole", tool_name: str = "tt_smi"):
     """
     Loads the fw_defines.yaml with arc msg definitions from the chip's data directory.
+    The file is only parsed once per chip and tool, treat the result as read-only.
     """
-    fw_defines = safe_load(
-        get_chip_data(chip_name, "fw_defines.yaml", False, tool_name)
-    )
+    with get_chip_data(chip_name, "fw_defines.yaml", False, tool_name) as f:
+        fw_defines = load(f, Loader=SafeLoader)
     return fw_defines
 
 
 def int_to_bits(x):
-    return list(filter(lambda b: x & (1 << b), range(x.bit_length())))
+    """Return the positions of the set bits of a non-negative int, lowest first"""
+    # A negative int has infinitely many set bits and the loop below would never end,
+    # keep the old behaviour of only checking the bits within its bit length
+    if x < 0:
+        return [b for b in range(x.bit_length()) if x & (1 << b)]
+    bits = []
+    while x:
+        # Isolate the lowest set bit, its bit length gives its position
+        lsb = x & -x
+        bits.append(lsb.bit_length() - 1)
+        x ^= lsb
+    return bits
 
 
 def get_chip_data(chip_name, file, internal: bool, tool_name="tt_smi"):
     """
     Helper function to load a file from the chip's data directory.
     """
-    with importlib.resources.path(f"{tool_name}", "") as path:
-        if chip_name not in ["wormhole", "grayskull"]:
-            raise Exception("Only support fw messages for Wh or GS chips")
-        prefix = chip_name
-        if internal:
-            prefix = f".ignored/{prefix}"
-        else:
-            prefix = f"data/{prefix}" if not ".data" in tool_name else prefix
-        return open(str(path.joinpath(f"{prefix}/{file}")))
+    if chip_name not in SUPPORTED_DATA_CHIPS:
+        raise Exception("Only support fw messages for Wh or GS chips")
+    prefix = chip_name
+    if internal:
+        prefix = f".ignored/{prefix}"
+    else:
+        prefix = f"data/{prefix}" if not ".data" in tool_name else prefix
+    root = _tool_files(tool_name)
+    if root is None:
+        # The path is only guaranteed to exist inside the context, so open it there
+        with importlib.resources.path(f"{tool_name}", "") as path:
+            return open(os.path.join(str(path), prefix, file))
+    # Keep the Traversable and join one part at a time, for namespace packages
+    # files() returns a MultiplexedPath which has no usable str() path
+    resource = root
+    for part in (*prefix.split("/"), file):
+        resource = resource / part
+    return resource.open()
+
+
+@functools.lru_cache(maxsize=8)
+def _tool_files(tool_name: str):
+    """Resolve the resource root of a tool package once, None before python 3.9"""
+    try:
+        # files() is the non-deprecated API, but only exists from python 3.9
+        return importlib.resources.files(tool_name)
+    except AttributeError:
+        return None
+
+
+# Board type by the Unique Part Identifier (UPI) field of the board id
+UPI_TO_BOARD_TYPE = {
+    0x3: "e150",  # Formerly E300_105
+    0x7: "e75",
+    0x8: "NEBULA_CB",
+    0xA: "e300",  # Formerly E300_X2
+    0xB: "GALAXY",
+    0x14: "n300",  # Formerly NEBULA_X2
+    0x18: "n150",  # Formerly NEBULA_X1
+}
+# Board type by revision for UPI 0x1
+UPI1_REV_TO_BOARD_TYPE = {
+    0x2: "E300_R2",
+    0x3: "E300_R3",
+    0x4: "E300_R3",
+}
 
 
 def get_board_type(board_id: str) -> str:
@@ -57,69 +132,44 @@ def get_board_type(board_id: str) -> str:
                    |     +--------------- BBBBB = Unique Part Identifier (UPI)
                    +--------------------- AA
     """
-    serial_num = int(f"0x{board_id}", base=16)
+    serial_num = int(board_id, 16)
     upi = (serial_num >> 36) & 0xFFFFF
     rev = (serial_num >> 32) & 0xF
 
+    # The E300 UPI is split further by board revision
     if upi == 0x1:
-        if rev == 0x2:
-            return "E300_R2"
-        elif rev in (0x3, 0x4):
-            return "E300_R3"
-        else:
-            return "N/A"
-    elif upi == 0x3:
-        # Formerly E300_105
-        return "e150"
-    elif upi == 0x7:
-        return "e75"
-    elif upi == 0x8:
-        return "NEBULA_CB"
-    elif upi == 0xA:
-        # Formerly E300_X2
-        return "e300"
-    elif upi == 0xB:
-        return "GALAXY"
-    elif upi == 0x14:
-        # Formerly NEBULA_X2
-        return "n300"
-    elif upi == 0x18:
-        # Formerly NEBULA_X1
-        return "n150"
-    else:
-        return "N/A"
+        return UPI1_REV_TO_BOARD_TYPE.get(rev, "N/A")
+    return UPI_TO_BOARD_TYPE.get(upi, "N/A")
 
 
 def hex_to_date(hexdate: int, include_time=True):
     """Converts a date given in hex from format 0xYMDDHHMM to string YYYY-MM-DD HH:MM"""
-    if hexdate == 0 or hexdate == 0xFFFFFFFF:
+    if hexdate in (0, 0xFFFFFFFF):
         return "N/A"
 
-    year = (hexdate >> 28 & 0xF) + 2020
-    month = hexdate >> 24 & 0xF
-    day = hexdate >> 16 & 0xFF
-    hour = hexdate >> 8 & 0xFF
-    minute = hexdate & 0xFF
-
-    date = f"{year:04}-{month:02}-{day:02}"
+    # Split into bytes in one go, the first byte holds the year and month nibbles
+    year_month, day, hour, minute = (hexdate & 0xFFFFFFFF).to_bytes(4, "big")
+    year, month = divmod(year_month, 16)
+    year += 2020
 
+    # Format in one go rather than appending the time to the date
     if include_time:
-        date += f" {hour:02}:{minute:02}"
+        return f"{year:04}-{month:02}-{day:02} {hour:02}:{minute:02}"
+    return f"{year:04}-{month:02}-{day:02}"
 
-    return date
 
-
-def init_logging(log_folder: str):
-    """Create tt-mod log folders if they don't exist"""
-    if not os.path.isdir(log_folder):
-        os.mkdir(log_folder)
+def _check_bytes(*values: int):
+    """Every field packed into the hex encodings must fit in a byte"""
+    for value in values:
+        if not 0 <= value <= 0xFF:
+            raise ValueError("byte must be in range(0, 256)")
 
 
 def semver_to_hex(semver: str):
     """Converts a semantic version string from format 10.15.1 to hex 0x0A0F0100"""
-    major, minor, patch = semver.split(".")
-    byte_array = bytearray([0, int(major), int(minor), int(patch)])
-    return f"{int.from_bytes(byte_array, byteorder='big'):08x}"
+    major, minor, patch = (int(part) for part in semver.split("."))
+    _check_bytes(major, minor, patch)
+    return f"{major << 16 | minor << 8 | patch:08x}"
 
 
 def date_to_hex(date: int):
@@ -129,25 +179,24 @@ def date_to_hex(date: int):
     day = int(date[6:8])
     hour = int(date[8:10])
     minute = int(date[10:12])
-    byte_array = bytearray([year * 16 + month, day, hour, minute])
-    return f"{int.from_bytes(byte_array, byteorder='big'):08x}"
+    year_month = year * 16 + month
+    _check_bytes(year_month, day, hour, minute)
+    return f"{year_month << 24 | day << 16 | hour << 8 | minute:08x}"
 
 
 def hex_to_semver(hexsemver: int):
     """Converts a semantic version string from format 0x0A0F0100 to 10.15.1"""
-    if hexsemver == 0 or hexsemver == 0xFFFFFFFF:
+    if hexsemver in (0, 0xFFFFFFFF):
         raise ValueError("hexsemver is invalid!")
 
-    major = hexsemver >> 16 & 0xFF
-    minor = hexsemver >> 8 & 0xFF
-    patch = hexsemver >> 0 & 0xFF
+    major, minor, patch = (hexsemver & 0xFFFFFF).to_bytes(3, "big")
 
     return f"{major}.{minor}.{patch}"
 
 
 def hex_to_semver_eth(hexsemver: int):
     """Converts a semantic version string from format 0x061000 to 6.1.0"""
-    if hexsemver == 0 or hexsemver == 0xFFFFFF:
+    if hexsemver in (0, 0xFFFFFF):
         return "N/A"
 
     major = hexsemver >> 16 & 0xFF
@@ -159,51 +208,56 @@ def hex_to_semver_eth(hexsemver: int):
 
 def hex_to_semver_m3_fw(hexsemver: int):
     """Converts a semantic version string from format 0x0A0F0100 to 10.15.1"""
-    if hexsemver == 0 or hexsemver == 0xFFFFFFFF:
+    if hexsemver in (0, 0xFFFFFFFF):
         return "N/A"
 
-    major = hexsemver >> 24 & 0xFF
-    minor = hexsemver >> 16 & 0xFF
-    patch = hexsemver >> 8 & 0xFF
-    ver = hexsemver >> 0 & 0xFF
+    major, minor, patch, ver = (hexsemver & 0xFFFFFFFF).to_bytes(4, "big")
 
     return f"{major}.{minor}.{patch}.{ver}"
 
 
 def init_logging(log_folder: str):
     """Create log folders if they don't exist"""
-    if not os.path.isdir(log_folder):
-        os.makedirs(log_folder)
+    os.makedirs(log_folder, exist_ok=True)
 
 
 # Show that the refclock counter (ARC_RESET.REFCLK_COUNTER_LOW/HIGH) is ticking at
 # the expected frequency, independent of ARCLK.
 
 
-def read_refclk_counter(chip) -> int:
+def _refclk_addrs(chip) -> Tuple[int, int]:
+    """Translate the REFCLK_COUNTER high and low register addresses for a chip"""
+    return (
+        chip.axi_translate("ARC_RESET.REFCLK_COUNTER_HIGH").addr,
+        chip.axi_translate("ARC_RESET.REFCLK_COUNTER_LOW").addr,
+    )
+
+
+def read_refclk_counter(chip, refclk_addrs: Optional[Tuple[int, int]] = None) -> int:
     if chip.as_gs():
         return None
-    high_addr = chip.axi_translate("ARC_RESET.REFCLK_COUNTER_HIGH").addr
-    low_addr = chip.axi_translate("ARC_RESET.REFCLK_COUNTER_LOW").addr
-    high1 = chip.axi_read32(high_addr)
-    low = chip.axi_read32(low_addr)
-    high2 = chip.axi_read32(high_addr)
-
-    if high1 != high2:
+    # Callers reading the counter repeatedly can translate the addresses once and pass them in
+    high_addr, low_addr = refclk_addrs or _refclk_addrs(chip)
+    # The counter is read as two 32 bit halves, retry until the high half
+    # is the same on both sides of the low read so the value is never torn
+    while True:
+        high1 = chip.axi_read32(high_addr)
         low = chip.axi_read32(low_addr)
-
-    return (high2 << 32) | low
+        high2 = chip.axi_read32(high_addr)
+        if high1 == high2:
+            return (high1 << 32) | low
 
 
 # Returns REFCLK_COUNTER rate in MHz
 def refclk_counter_rate(chip, delay_interval: float = 0.1) -> float:
-    before_refclk = read_refclk_counter(chip)
-    before_ns = time.time_ns()
+    refclk_addrs = None if chip.as_gs() else _refclk_addrs(chip)
+    before_refclk = read_refclk_counter(chip, refclk_addrs)
+    before_ns = time.perf_counter_ns()
 
     time.sleep(delay_interval)
 
-    after_refclk = read_refclk_counter(chip)
-    after_ns = time.time_ns()
+    after_refclk = read_refclk_counter(chip, refclk_addrs)
+    after_ns = time.perf_counter_ns()
 
     return (after_refclk - before_refclk) * 1000 / (after_ns - before_ns)
 
@@ -211,10 +265,12 @@ def refclk_counter_rate(chip, delay_interval: float = 0.1) -> float:
 def check_refclk_counter_read_speed(chip):
     loops = 100
 
-    before_ns = time.time_ns()
+    # Translate once so the loop only measures the register reads, GS chips have no counter
+    refclk_addrs = None if chip.as_gs() else _refclk_addrs(chip)
+    before_ns = time.perf_counter_ns()
     for _ in range(loops):
-        read_refclk_counter(chip)
-    after_ns = time.time_ns()
+        read_refclk_counter(chip, refclk_addrs)
+    after_ns = time.perf_counter_ns()
 
     if after_ns - before_ns > 100_000 * loops:
         us_per = (after_ns - before_ns) // (loops * 1000)
@@ -246,7 +302,6 @@ def detect_chips_with_callback(
     block_count = 0
     arc_count = 0
     dram_count = 0
-    spinner = ["\\", "|", "/", "-"]
 
     last_draw = time.time()
 
@@ -261,8 +316,8 @@ def detect_chips_with_callback(
 
         # Move the cursor and delete the previous block of printed lines
         if block_count > 0 and print_status:
-            print(f"\033[{block_count}A", end="", flush=True)
-            print(f"\033[J", end="", flush=True)
+            # Cursor up and clear to end of screen in a single write
+            print(f"\033[{block_count}A\033[J", end="", flush=True)
 
         if print_status:
             print(
@@ -272,43 +327,35 @@ def detect_chips_with_callback(
             )
             block_count = 1
 
+        # Nothing below is drawn when the status is suppressed, skip it entirely
+        if local_only or not print_status:
+            return
+
         # Prune and update the status string
         status_string = status.status_string()
-        if status_string is not None and local_only is False and print_status is True:
-            # remove empty lines
-            for line in list(filter(None, status_string.splitlines())):
+        if status_string is not None:
+            for line in status_string.splitlines():
+                # remove empty lines
+                if not line:
+                    continue
                 # Up the counter for each line printed
                 block_count += 1
                 if "ARC" in line:
                     arc_count = arc_count + 1
                     # Spinner character is based on the number of ARCs detected
-                    print(
-                        f"\r{CMD_LINE_COLOR.BLUE} Detecting ARC: "
-                        + f"{CMD_LINE_COLOR.YELLOW}{spinner[arc_count % len(spinner)]}{CMD_LINE_COLOR.ENDC}",
-                        flush=True,
-                    )
+                    print(_ARC_SPIN[arc_count & 3], flush=True)
                 elif "DRAM" in line:
                     dram_count = dram_count + 1
-                    print(
-                        f"\r{CMD_LINE_COLOR.BLUE} Detecting DRAM: "
-                        + f"{CMD_LINE_COLOR.YELLOW}{spinner[dram_count % len(spinner)]}{CMD_LINE_COLOR.ENDC}",
-                        flush=True,
-                    )
+                    print(_DRAM_SPIN[dram_count & 3], flush=True)
                 elif "ETH" in line:
-                    import re
-
-                    paren_pattern = r"\((.*?)\)"
-                    bracket_pattern = r"\[(.*?)\]"
                     # Find substrings between parentheses
-                    paren_substr = re.search(paren_pattern, line)
-                    bracket_substr = re.search(bracket_pattern, line)
+                    paren_substr = PAREN_REGEXP.search(line)
                     # Extract substring from matched group
-                    bracket_substr = bracket_substr.group(1) if bracket_substr else ""
                     paren_substr = paren_substr.group(1) if paren_substr else ""
-                    line = re.sub(paren_pattern, "", line)
+                    line = PAREN_REGEXP.sub("", line)
                     print(
                         f"\r {CMD_LINE_COLOR.PURPLE}[{paren_substr}]{CMD_LINE_COLOR.BLUE}{line}: "
-                        + f"{CMD_LINE_COLOR.YELLOW}{spinner[dram_count % len(spinner)]}{CMD_LINE_COLOR.ENDC}",
+                        + f"{CMD_LINE_COLOR.YELLOW}{_SPINNER[dram_count & 3]}{CMD_LINE_COLOR.ENDC}",
                         flush=True,
                     )
                 else:
@@ -333,3 +380,23 @@ def detect_chips_with_callback(
         output.append(device)
 
     return output
+
+
+def classify_devices(devices) -> Dict[str, List[int]]:
+    """
+    Sort detected chips by type in a single pass
+    Local chips are listed by PCI interface id, remote chips by their index in devices
+    """
+    classified = {"wh": [], "gs": [], "bh": [], "remote": []}
+    for i, dev in enumerate(devices):
+        # Only WH chips can be remote, so is_remote is only asked of those
+        if dev.as_wh():
+            if dev.is_remote():
+                classified["remote"].append(i)
+            else:
+                classified["wh"].append(dev.get_pci_interface_id())
+        elif dev.as_gs():
+            classified["gs"].append(dev.get_pci_interface_id())
+        elif dev.as_bh():
+            classified["bh"].append(dev.get_pci_interface_id())
+    return classified